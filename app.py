@@ -1,6 +1,9 @@
+import numpy as np
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from prepare import DATA_PATH, PREPARED_PATH, is_stale, prepare
+
 # Page Config
 st.set_page_config(
     page_title="Reddit Narrative Spread Analysis",
@@ -17,97 +20,191 @@ A narrative represents a broader topic (e.g. technology, politics, conflict),
 identified using transparent keyword-based rules.  
 Each post is treated as an **act of amplification**.
 """)
-#Dataload
+# Dataload
+# Narrative detection happens offline in prepare.py; the app only reads the
+# prepared frame. Shared (not copied) across reruns and sessions.
+@st.cache_resource
+def load_narrative_df(path):
+    if is_stale(DATA_PATH, path):
+        prepare(DATA_PATH, path)
+    return pd.read_parquet(path, engine="pyarrow")
+
+
+# Daily post counts: one row per day, one column per narrative.
+# Days and category codes are small non-negative ints, so a flat bincount
+# over (day, narrative) pairs replaces the pandas groupby.
 @st.cache_data
-def load_data():
-    df = pd.read_json("data.jsonl", lines=True)
-    return pd.json_normalize(df["data"])
-
-data_df = load_data()
-
-clean_df = data_df[
-    ["subreddit", "author", "created_utc", "title", "selftext"]
-].copy()
-
-# Narrative Definitions
-NARRATIVES = {
-    "Technology / Big Tech": [
-        "technology", "tech", "ai", "artificial intelligence",
-        "google", "meta", "facebook", "twitter", "musk", "data"
-    ],
-    "Politics / Government": [
-        "election", "vote", "government", "policy", "bill",
-        "parliament", "congress", "minister", "president", "party"
-    ],
-    "Geopolitics / Conflict": [
-        "war", "attack", "terror", "terrorist", "military",
-        "missile", "killed", "invasion", "border", "conflict"
-    ],
-    "Economy / Jobs": [
-        "economy", "inflation", "jobs", "unemployment",
-        "recession", "market", "wages", "growth"
-    ],
-}
-
-# Text Preparation & Narrative Detection
-
-clean_df["text"] = (
-    clean_df["title"].fillna("") + " " +
-    clean_df["selftext"].fillna("")
-).str.lower()
-
-def detect_narratives(text):
-    matched = []
-    for narrative, keywords in NARRATIVES.items():
-        for kw in keywords:
-            if kw in text:
-                matched.append(narrative)
-                break
-    return matched
-
-clean_df["narratives"] = clean_df["text"].apply(detect_narratives)
-
-narrative_df = clean_df.explode("narratives")
-narrative_df = narrative_df.dropna(subset=["narratives"])
-
-
-# Time Processing
-
-narrative_df["created_time"] = pd.to_datetime(
-    narrative_df["created_utc"], unit="s"
-)
+def build_counts_by_day(path):
+    narrative_df = load_narrative_df(path)
+    codes = narrative_df["narratives"].cat.codes.to_numpy()
+    # Widen before combining so int16 days * n_narratives cannot overflow
+    days = narrative_df["days_since_start"].to_numpy().astype(np.intp)
+    names = narrative_df["narratives"].cat.categories
+
+    n_narratives = len(names)
+    n_days = int(days.max()) + 1
+    counts = np.bincount(
+        days * n_narratives + codes, minlength=n_days * n_narratives
+    ).reshape(n_days, n_narratives)
+
+    return pd.DataFrame(
+        counts,
+        index=pd.RangeIndex(n_days, name="days_since_start"),
+        columns=names,
+    )
 
-first_seen = (
-    narrative_df
-    .groupby("narratives")["created_time"]
-    .min()
-    .reset_index()
-    .rename(columns={"created_time": "first_seen"})
-)
 
-narrative_df = narrative_df.merge(first_seen, on="narratives", how="left")
+# Narrative rows presorted by (narrative, day), with each narrative's row
+# span, so a time window is two binary searches per narrative and a
+# contiguous slice instead of a full-frame boolean mask.
+@st.cache_data
+def build_sorted_index(path):
+    sorted_df = (
+        load_narrative_df(path)
+        [["narratives", "days_since_start", "subreddit"]]
+        .sort_values(["narratives", "days_since_start"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+    names = sorted_df["narratives"].cat.categories
+    codes = sorted_df["narratives"].cat.codes.to_numpy()
+    bounds = np.searchsorted(codes, np.arange(len(names) + 1))
+    spans = {
+        narrative: (int(bounds[i]), int(bounds[i + 1]))
+        for i, narrative in enumerate(names)
+    }
+
+    return sorted_df, spans
+
+
+def window_spans(sorted_df, spans, day_range):
+    days = sorted_df["days_since_start"].to_numpy()
+    window = {}
+    for narrative, (start, end) in spans.items():
+        narrative_days = days[start:end]
+        lo = np.searchsorted(narrative_days, day_range[0], side="left")
+        hi = np.searchsorted(narrative_days, day_range[1], side="right")
+        window[narrative] = (start + int(lo), start + int(hi))
+    return window
+
+
+# Widget-dependent views. Keyed only on the path and widget values, so
+# moving the slider back to a previous position is a cache lookup.
+@st.cache_data(max_entries=64)
+def window_stats(path, day_range):
+    sorted_df, spans = build_sorted_index(path)
+    window = window_spans(sorted_df, spans, day_range)
+    sub_codes = sorted_df["subreddit"].cat.codes.to_numpy()
+
+    posts = pd.Series(
+        {narrative: hi - lo for narrative, (lo, hi) in window.items()}
+    )
+    window_subs = np.concatenate(
+        [sub_codes[lo:hi] for lo, hi in window.values()]
+    )
+
+    narrative_counts = (
+        posts[posts > 0]
+        .sort_values(ascending=False, kind="stable")
+        .reset_index()
+    )
+    narrative_counts.columns = ["Narrative", "Post Count"]
+
+    return (
+        int(posts.sum()),
+        len(np.unique(window_subs)),
+        int((posts > 0).sum()),
+        narrative_counts,
+    )
+
+
+@st.cache_data(max_entries=64)
+def narrative_view(path, day_range, narrative):
+    narrative_series = build_counts_by_day(path)[narrative]
+    peak_day = int(narrative_series.idxmax())
+
+    sorted_df, spans = build_sorted_index(path)
+    lo, hi = window_spans(
+        sorted_df, {narrative: spans[narrative]}, day_range
+    )[narrative]
+    subreddit = sorted_df["subreddit"]
+    subreddit_names = np.asarray(subreddit.cat.categories)
+
+    posts_per_subreddit = np.bincount(
+        subreddit.cat.codes.to_numpy()[lo:hi], minlength=len(subreddit_names)
+    )
+    communities_reached = int((posts_per_subreddit > 0).sum())
+
+    # Top 10 by partial selection over active subreddits only
+    top = np.flatnonzero(posts_per_subreddit)
+    if len(top) > 10:
+        top = top[np.argpartition(-posts_per_subreddit[top], 9)[:10]]
+    top = np.sort(top)
+    top = top[np.argsort(-posts_per_subreddit[top], kind="stable")]
+
+    community_counts = pd.Series(
+        posts_per_subreddit[top],
+        index=pd.Index(subreddit_names[top], name="subreddit"),
+    )
 
-narrative_df["days_since_start"] = (
-    narrative_df["created_time"] - narrative_df["first_seen"]
-).dt.days
+    # Only days with activity, as zero-filled days come from the shared pivot
+    return (
+        narrative_series[narrative_series > 0],
+        peak_day,
+        int(hi - lo),
+        communities_reached,
+        community_counts,
+    )
+
+
+# Scalars for the Key Observations text, reusing the cached views above
+@st.cache_data(max_entries=64)
+def observations(path, day_range, narrative):
+    window_posts, _, _, narrative_counts = window_stats(path, day_range)
+    _, peak_day, _, communities_reached, _ = narrative_view(
+        path, day_range, narrative
+    )
+
+    daily_posts = (
+        build_counts_by_day(path)
+        .loc[day_range[0]:day_range[1]]
+        .sum(axis=1)
+    )
+
+    return {
+        "dominant": narrative_counts["Narrative"].iloc[0],
+        "avg_per_day": window_posts / int((daily_posts > 0).sum()),
+        "days_to_peak": peak_day,
+        "communities": communities_reached,
+    }
+
+
+# Widget options as plain scalars, so a rerun never copies a frame out of
+# the cache just to draw the slider and selectbox
+@st.cache_data
+def widget_options(path):
+    counts_by_day = build_counts_by_day(path)
+    return 0, len(counts_by_day) - 1, sorted(counts_by_day.columns)
+
+
+min_day, max_day, narrative_names = widget_options(PREPARED_PATH)
 
 
 # GLOBAL TIME WINDOW Slicer
 
 st.subheader("Global Time Window")
 
-min_day = int(narrative_df["days_since_start"].min())
-max_day = int(narrative_df["days_since_start"].max())
-
 day_range = st.slider(
     "Select analysis window (days since narrative first appeared):",
     min_day, max_day, (min_day, max_day)
 )
 
-window_df = narrative_df[
-    (narrative_df["days_since_start"] >= day_range[0]) &
-    (narrative_df["days_since_start"] <= day_range[1])
-]
+(
+    window_posts,
+    active_communities,
+    active_narratives,
+    narrative_counts,
+) = window_stats(PREPARED_PATH, day_range)
 
 
 # KPIs
@@ -117,26 +214,18 @@ st.subheader("Dataset Activity (Selected Window)")
 c1, c2, c3 = st.columns(3)
 
 with c1:
-    st.metric("Total Amplifications", len(window_df))
+    st.metric("Total Amplifications", window_posts)
 
 with c2:
-    st.metric("Active Communities", window_df["subreddit"].nunique())
+    st.metric("Active Communities", active_communities)
 
 with c3:
-    st.metric("Narratives Active", window_df["narratives"].nunique())
+    st.metric("Narratives Active", active_narratives)
 
 
 # Narrative Distribution (Selected Window)
 st.subheader("Narrative Distribution in Selected Window")
 
-narrative_counts = (
-    window_df["narratives"]
-    .value_counts()
-    .reset_index()
-)
-
-narrative_counts.columns = ["Narrative", "Post Count"]
-
 st.dataframe(narrative_counts, use_container_width=True)
 
 
@@ -144,141 +233,87 @@ st.dataframe(narrative_counts, use_container_width=True)
 
 st.subheader("Narrative Growth Dynamics")
 
-narrative_time_df = (
-    narrative_df
-    .groupby(["days_since_start", "narratives"])
-    .size()
-    .reset_index(name="count")
-)
-
 selected_narrative = st.selectbox(
     "Select a narrative:",
-    sorted(narrative_time_df["narratives"].unique())
+    narrative_names
 )
 
+(
+    filtered,
+    peak_day,
+    selected_posts,
+    communities_reached,
+    community_counts,
+) = narrative_view(PREPARED_PATH, day_range, selected_narrative)
 
-# Narrative-Specific KPIs (Dynamic)
 
-selected_df = window_df[
-    window_df["narratives"] == selected_narrative
-]
-
-peak_row = (
-    narrative_time_df[
-        narrative_time_df["narratives"] == selected_narrative
-    ]
-    .sort_values("count", ascending=False)
-    .iloc[0]
-)
+# Narrative-Specific KPIs (Dynamic)
 
 k1, k2, k3 = st.columns(3)
 
 with k1:
-    st.metric("Total Amplifications", len(selected_df))
+    st.metric("Total Amplifications", selected_posts)
 
 with k2:
-    st.metric("Communities Reached", selected_df["subreddit"].nunique())
+    st.metric("Communities Reached", communities_reached)
 
 with k3:
-    st.metric("Days to Peak Activity", int(peak_row["days_since_start"]))
+    st.metric("Days to Peak Activity", peak_day)
 
 # Timeline Plot (Days Since First Appearance)
 
-filtered = narrative_time_df[
-    narrative_time_df["narratives"] == selected_narrative
-]
-
-fig, ax = plt.subplots()
-ax.plot(filtered["days_since_start"], filtered["count"], marker="o")
-ax.set_xlabel("Days Since Narrative First Appeared")
-ax.set_ylabel("Number of Posts")
-ax.set_title(f"Growth Pattern: {selected_narrative}")
-st.pyplot(fig)
+st.caption(f"Growth Pattern: {selected_narrative}")
+st.line_chart(
+    filtered.rename("Number of Posts"),
+    x_label="Days Since Narrative First Appeared",
+    y_label="Number of Posts",
+)
 
 
 # Community Amplification
 
 st.subheader("Community Amplification (Selected Window)")
 
-community_counts = (
-    selected_df
-    .groupby("subreddit")
-    .size()
-    .sort_values(ascending=False)
-    .head(10)
+st.caption("Top Communities Amplifying This Narrative")
+st.bar_chart(
+    community_counts.rename("Number of Posts"),
+    x_label="Subreddit",
+    y_label="Number of Posts",
+    sort=False,
 )
 
-fig2, ax2 = plt.subplots()
-community_counts.plot(kind="bar", ax=ax2)
-ax2.set_xlabel("Subreddit")
-ax2.set_ylabel("Number of Posts")
-ax2.set_title("Top Communities Amplifying This Narrative")
-st.pyplot(fig2)
-
 
 # Key Observations & Conclusions
 
 st.subheader("Key Observations from the Analysis")
 
-if len(window_df) == 0:
+if window_posts == 0:
     st.write(
         "No posts fall within the selected time window. "
         "Please expand the window to view narrative activity."
     )
 else:
-    # Dominant narrative in selected window
-    dominant_narrative = (
-        window_df["narratives"]
-        .value_counts()
-        .idxmax()
-    )
-
-    # Average activity per day
-    avg_posts_per_day = (
-        window_df
-        .groupby("days_since_start")
-        .size()
-        .mean()
-    )
-
-    # Narrative-specific slice (recomputed safely)
-    selected_df_local = window_df[
-        window_df["narratives"] == selected_narrative
-    ]
-
-    # Communities reached (local computation)
-    communities_reached_local = selected_df_local["subreddit"].nunique()
-
-    # Days to peak activity (local computation)
-    peak_row_local = (
-        narrative_time_df[
-            narrative_time_df["narratives"] == selected_narrative
-        ]
-        .sort_values("count", ascending=False)
-        .iloc[0]
-    )
-
-    days_to_peak_local = int(peak_row_local["days_since_start"])
+    obs = observations(PREPARED_PATH, day_range, selected_narrative)
 
     st.write(
         f"""
         **1. Dominant Narrative**  
         During the selected time window, discussions were most concentrated around
-        the **{dominant_narrative}** narrative. This suggests that this topic received
+        the **{obs["dominant"]}** narrative. This suggests that this topic received
         comparatively higher attention from Reddit users in this period.
 
         **2. Speed of Attention Growth**  
         The selected narrative reached its peak activity approximately
-        **{days_to_peak_local} days** after first appearing. This indicates how quickly
+        **{obs["days_to_peak"]} days** after first appearing. This indicates how quickly
         attention formed around the topic once it entered discussion.
 
         **3. Community Involvement**  
-        The narrative was discussed across **{communities_reached_local} different subreddits**,
+        The narrative was discussed across **{obs["communities"]} different subreddits**,
         suggesting that attention was not limited to a single community but spread
         across multiple audiences.
 
         **4. Overall Activity Level**  
-        On average, Reddit saw approximately **{avg_posts_per_day:.1f} narrative-related posts per day**
+        On average, Reddit saw approximately **{obs["avg_per_day"]:.1f} narrative-related posts per day**
         within the selected window. This reflects a moderate but sustained level of engagement.
 
         **Overall Interpretation**  
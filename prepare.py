@@ -0,0 +1,166 @@
+# Offline ingest: detects narratives in the raw Reddit dump once and writes
+# the minimal frame the dashboard needs. Run `python prepare.py` after
+# updating data.jsonl; app.py also reruns it when the prepared file is stale.
+import functools
+import hashlib
+import json
+import os
+
+import ahocorasick
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Narrative Definitions
+NARRATIVES = {
+    "Technology / Big Tech": [
+        "technology", "tech", "ai", "artificial intelligence",
+        "google", "meta", "facebook", "twitter", "musk", "data"
+    ],
+    "Politics / Government": [
+        "election", "vote", "government", "policy", "bill",
+        "parliament", "congress", "minister", "president", "party"
+    ],
+    "Geopolitics / Conflict": [
+        "war", "attack", "terror", "terrorist", "military",
+        "missile", "killed", "invasion", "border", "conflict"
+    ],
+    "Economy / Jobs": [
+        "economy", "inflation", "jobs", "unemployment",
+        "recession", "market", "wages", "growth"
+    ],
+}
+
+DATA_PATH = "data.jsonl"
+PREPARED_PATH = "prepared.parquet"
+
+# Bump whenever the columns or dtypes of the prepared frame change.
+SCHEMA_VERSION = 2
+
+# Stored in the Parquet metadata; a prepared file written with a different
+# schema or different narrative keywords is regenerated rather than trusted.
+VERSION_KEY = b"narrative_version"
+
+
+def prepared_version():
+    key = json.dumps([SCHEMA_VERSION, NARRATIVES])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+# One automaton over every keyword, tagged with its narrative bit
+# (bit k = k-th narrative), so each post is scanned exactly once regardless
+# of how many narratives exist. A uint8 mask holds up to 8 narratives.
+# Built lazily and once per process: app.py imports this module on every
+# start but only needs the automaton when the prepared file is stale.
+@functools.cache
+def get_automaton():
+    automaton = ahocorasick.Automaton()
+    for idx, keywords in enumerate(NARRATIVES.values()):
+        for kw in keywords:
+            automaton.add_word(kw, automaton.get(kw, 0) | (1 << idx))
+    automaton.make_automaton()
+    return automaton
+
+
+def detect_narratives(texts):
+    # Single pass per post -> one packed narrative bitmask per post
+    automaton = get_automaton()
+    masks = np.zeros(len(texts), dtype=np.uint8)
+    for i, t in enumerate(texts):
+        mask = 0
+        for _, narrative_bits in automaton.iter(t):
+            mask |= narrative_bits
+        masks[i] = mask
+    return masks
+
+
+# Dataload, Narrative Detection & Time Processing
+def build_narrative_df(path):
+    # Parse each line once and keep only the fields we use. The matcher
+    # needs plain Python str, so the lowered text is built here directly
+    # instead of going through a pandas string column.
+    keys = ("subreddit", "author", "created_utc")
+    rows = []
+    texts = []
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                post = orjson.loads(line)["data"]
+                rows.append(tuple(post.get(k) for k in keys))
+                texts.append(
+                    f"{post.get('title') or ''} {post.get('selftext') or ''}"
+                    .lower()
+                )
+    clean_df = pd.DataFrame(rows, columns=list(keys))
+
+    # Narrative Detection
+    clean_df["narr_mask"] = detect_narratives(texts)
+
+    # One output row per (post, matched narrative), straight from the
+    # unpacked bits -- no intermediate list column to explode
+    rows, cols = np.nonzero(np.unpackbits(
+        clean_df["narr_mask"].to_numpy()[:, None],
+        axis=1, count=len(NARRATIVES), bitorder="little",
+    ))
+    narrative_df = clean_df.iloc[rows].reset_index(drop=True)
+    narrative_df["narratives"] = pd.Categorical.from_codes(
+        cols, categories=list(NARRATIVES)
+    )
+
+    # Time Processing
+    # Days since each narrative's first post, in plain int64 seconds
+    narrative_df["created_utc"] = narrative_df["created_utc"].astype(np.int64)
+
+    first_seen = (
+        narrative_df
+        .groupby("narratives", observed=True)["created_utc"]
+        .transform("min")
+    )
+
+    narrative_df["days_since_start"] = (
+        (narrative_df["created_utc"] - first_seen) // 86400
+    ).astype(np.int16)
+
+    # Repeated strings -> integer codes for groupby / nunique / filters
+    # (narratives is already categorical from detection)
+    narrative_df["subreddit"] = narrative_df["subreddit"].astype("category")
+
+    # Only what the dashboard reads; text and authors stay out of the app
+    return narrative_df[["subreddit", "narratives", "days_since_start"]]
+
+
+def prepare(data_path=DATA_PATH, out_path=PREPARED_PATH):
+    table = pa.Table.from_pandas(build_narrative_df(data_path))
+    table = table.replace_schema_metadata({
+        **table.schema.metadata,
+        VERSION_KEY: prepared_version().encode(),
+    })
+
+    # Write aside and swap in, so an interrupted run never leaves a
+    # truncated file with a fresh mtime at out_path
+    tmp_path = out_path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, out_path)
+
+
+def is_stale(data_path=DATA_PATH, out_path=PREPARED_PATH):
+    try:
+        metadata = pq.read_schema(out_path).metadata or {}
+    except (OSError, pa.ArrowException):
+        # Missing or unreadable
+        return True
+
+    if metadata.get(VERSION_KEY) != prepared_version().encode():
+        return True
+
+    # The raw dump is optional once the prepared file exists
+    return (
+        os.path.exists(data_path) and
+        os.path.getmtime(data_path) > os.path.getmtime(out_path)
+    )
+
+
+if __name__ == "__main__":
+    prepare()